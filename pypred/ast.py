@@ -2,10 +2,31 @@
 This module provides the AST nodes that are used to
 represent and later, evaluate a predicate.
 """
+import operator
 import re
 from copy import deepcopy
 from functools import wraps
 
+try:
+    intern
+except NameError: # python3
+    from sys import intern
+
+# Builtin types whose hash agrees with their equality, so
+# that an IndexedDispatch can look up their values in a table.
+# Subclasses are excluded since they may override either one.
+try:
+    DISPATCH_TYPES = frozenset([str, unicode, int, long, float])
+except NameError: # python3
+    DISPATCH_TYPES = frozenset([str, int, float])
+
+# Integer tags identifying each type of node. These allow
+# hot paths to check the node type with a single compare.
+(KIND_NODE, KIND_LOGICAL, KIND_NEGATE, KIND_COMPARE, KIND_CONTAINS,
+ KIND_MATCH, KIND_REGEX, KIND_LITERAL, KIND_NUMBER, KIND_CONSTANT,
+ KIND_UNDEFINED, KIND_EMPTY, KIND_PUSH_RESULT, KIND_BRANCH, KIND_BOTH,
+ KIND_CACHED, KIND_LITERAL_SET, KIND_DISPATCH) = range(18)
+
 
 class EvalContext(object):
     """
@@ -53,8 +74,31 @@ def failure_info(func):
 
 class Node(object):
     "Root object in the AST tree"
-    # Unknown default position
-    position = "line: ?, col: ?"
+    __slots__ = ("_position",)
+    kind = KIND_NODE
+
+    def _get_position(self):
+        # Unknown default position
+        return getattr(self, "_position", "line: ?, col: ?")
+
+    def _set_position(self, position):
+        self._position = position
+
+    position = property(_get_position, _set_position)
+
+    def __getstate__(self):
+        # Slotted classes have no __dict__, so collect the slots
+        # of every class for pickling with the older protocols
+        state = {}
+        for cls in type(self).__mro__:
+            for attr in getattr(cls, "__slots__", ()):
+                if hasattr(self, attr):
+                    state[attr] = getattr(self, attr)
+        return state
+
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
 
     def set_position(self, line, col):
         self.position = "line: %d, col %d" % (line, col)
@@ -104,11 +148,24 @@ class Node(object):
         Performs a pre-order traversal of the
         tree, and invokes a callback for each node.
         """
-        func(self)
-        if hasattr(self, "left"):
-            self.left.pre(func)
-        if hasattr(self, "right"):
-            self.right.pre(func)
+        for node in self.iter_pre():
+            func(node)
+
+    def iter_pre(self):
+        "Returns a generator of the nodes of the tree in pre-order"
+        # Use an explicit stack to avoid recursion on deep trees.
+        # The children are pushed in reverse so the left is visited first.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            children = node.children()
+            if children:
+                stack.extend(reversed(children))
+
+    def children(self):
+        "Returns a tuple of the left and right child nodes"
+        return ()
 
     def validate(self, info=None):
         """
@@ -160,11 +217,23 @@ class Node(object):
 
 class LogicalOperator(Node):
     "Used for the logical operators"
+    __slots__ = ("type", "left", "right")
+    kind = KIND_LOGICAL
+
     def __init__(self, op, left, right):
         self.type = op
         self.left = left
         self.right = right
 
+    def children(self):
+        return (self.left, self.right)
+
+    def __deepcopy__(self, memo=None):
+        n = LogicalOperator(self.type, deepcopy(self.left, memo),
+                deepcopy(self.right, memo))
+        n.position = self.position
+        return n
+
     def name(self):
         return "%s operator at %s" % (self.type.upper(), self.position)
 
@@ -179,18 +248,24 @@ class LogicalOperator(Node):
     @failure_info
     def eval(self, ctx):
         "Implement short-circuit logic"
-        if self.type == "and":
-            if not self.left.eval(ctx):
-                return False
-            if not self.right.eval(ctx):
-                return False
-            return True
-        else:
-            if self.left.eval(ctx):
-                return True
-            if self.right.eval(ctx):
-                return True
-            return False
+        # An 'or' short-circuits on True, an 'and' on False
+        short = self.type == "or"
+
+        # Chains of the same operator such as (a and (b and c))
+        # are walked in a loop instead of recursing. When analyzing,
+        # each node is evaluated to record its failure information.
+        node = self
+        while True:
+            if bool(node.left.eval(ctx)) == short:
+                return short
+            right = node.right
+            if ctx.analyze or right.kind != KIND_LOGICAL or right.type != node.type:
+                break
+            node = right
+
+        if bool(right.eval(ctx)) == short:
+            return short
+        return not short
 
     def failure_info(self, ctx):
         with ctx:
@@ -209,9 +284,20 @@ class LogicalOperator(Node):
 
 class NegateOperator(Node):
     "Used to negate a result"
+    __slots__ = ("left",)
+    kind = KIND_NEGATE
+
     def __init__(self, expr):
         self.left = expr
 
+    def children(self):
+        return (self.left,)
+
+    def __deepcopy__(self, memo=None):
+        n = NegateOperator(deepcopy(self.left, memo))
+        n.position = self.position
+        return n
+
     def name(self):
         return "not operator at %s" % (self.position)
 
@@ -226,6 +312,8 @@ class NegateOperator(Node):
 
 class CompareOperator(Node):
     "Used for all the mathematical comparisons"
+    __slots__ = ("type", "category", "func", "left", "right")
+    kind = KIND_COMPARE
     OP_REVERSE = {
             ">=": "<=", # a >= b -> b =< a
             ">": "<",   # a > b  -> b < a
@@ -236,11 +324,50 @@ class CompareOperator(Node):
             "is": "is"  # a is b -> b is a
     }
 
+    # Maps each operator to its category, which is
+    # not changed by reversing the term order
+    OP_CATEGORY = {
+            ">=": "order",
+            ">": "order",
+            "<": "order",
+            "<=": "order",
+            "=": "equality",
+            "!=": "equality",
+            "is": "equality"
+    }
+
+    # Maps each operator to the function implementing it
+    OP_FUNCS = {
+            ">=": operator.ge,
+            ">": operator.gt,
+            "<": operator.lt,
+            "<=": operator.le,
+            "=": operator.eq,
+            "!=": operator.ne,
+            "is": operator.eq
+    }
+
     def __init__(self, comparison, left, right):
         self.type = comparison
+        self.category = self.OP_CATEGORY.get(comparison, comparison)
+        self.func = self.OP_FUNCS.get(comparison, self.unknown_op)
         self.left = left
         self.right = right
 
+    def children(self):
+        return (self.left, self.right)
+
+    @staticmethod
+    def unknown_op(left, right):
+        "Unknown operators fail validation, and never match"
+        return None
+
+    def __deepcopy__(self, memo=None):
+        n = CompareOperator(self.type, deepcopy(self.left, memo),
+                deepcopy(self.right, memo))
+        n.position = self.position
+        return n
+
     def name(self):
         return "%s comparison at %s" % (self.type.upper(), self.position)
 
@@ -260,32 +387,22 @@ class CompareOperator(Node):
 
         # Reverse the op type
         self.type = self.OP_REVERSE[self.type]
+        self.func = self.OP_FUNCS[self.type]
 
     @failure_info
     def eval(self, ctx):
         left = self.left.eval(ctx)
         right = self.right.eval(ctx)
 
-        # Check if this is an equality check
-        if self.type in ("=", "is"):
-            return left == right
-        elif self.type == "!=":
-            return left != right
-
-        # Compare operations against undefined or empty always fail
-        if isinstance(left, (Undefined, Empty)):
-            return False
-        if isinstance(right, (Undefined, Empty)):
-            return False
+        # Compare operations against undefined or empty always fail,
+        # unless they are an equality check
+        if self.category != "equality":
+            if isinstance(left, (Undefined, Empty)):
+                return False
+            if isinstance(right, (Undefined, Empty)):
+                return False
 
-        if self.type == ">=":
-            return left >= right
-        elif self.type == ">":
-            return left > right
-        elif self.type == "<=":
-            return left <= right
-        elif self.type == "<":
-            return left < right
+        return self.func(left, right)
 
     def failure_info(self, ctx):
         with ctx:
@@ -308,10 +425,21 @@ class CompareOperator(Node):
 
 class ContainsOperator(Node):
     "Used for the 'contains' operator"
+    __slots__ = ("left", "right")
+    kind = KIND_CONTAINS
+
     def __init__(self, left, right):
         self.left = left
         self.right = right
 
+    def children(self):
+        return (self.left, self.right)
+
+    def __deepcopy__(self, memo=None):
+        n = ContainsOperator(deepcopy(self.left, memo), deepcopy(self.right, memo))
+        n.position = self.position
+        return n
+
     def _validate(self, info):
         if not isinstance(self.right, (Number, Literal, Constant)):
             errs = info["errors"]
@@ -344,10 +472,21 @@ class ContainsOperator(Node):
 
 class MatchOperator(Node):
     "Used for the 'matches' operator"
+    __slots__ = ("left", "right")
+    kind = KIND_MATCH
+
     def __init__(self, left, right):
         self.left = left
         self.right = right
 
+    def children(self):
+        return (self.left, self.right)
+
+    def __deepcopy__(self, memo=None):
+        n = MatchOperator(deepcopy(self.left, memo), deepcopy(self.right, memo))
+        n.position = self.position
+        return n
+
     def _validate(self, info):
         if not isinstance(self.right, Regex):
             errs = info["errors"]
@@ -380,6 +519,8 @@ class MatchOperator(Node):
 
 class Regex(Node):
     "Regular expression literal"
+    __slots__ = ("value", "modifiers", "re")
+    kind = KIND_REGEX
     regex_extractor = re.compile("^['\"/](.*)['\"/]([simluSIMLU]*)$")
     modifiers_def = {
         's': re.DOTALL,
@@ -421,6 +562,11 @@ class Regex(Node):
                     (self.position, repr(self.value)))
             return False
 
+        # Already compiled, either by a previous validation
+        # or by an evaluation
+        if self.re is not None:
+            return True
+
         # Try to compile
         try:
             self.re = self._build_re()
@@ -441,11 +587,16 @@ class Regex(Node):
 
 class Literal(Node):
     "String literal"
-    static = False
-    static_val = None
+    __slots__ = ("value", "static", "static_val")
+    kind = KIND_LITERAL
 
     def __init__(self, value):
+        # Share the strings between all the literals with the same value
+        if type(value) is str:
+            value = intern(value)
         self.value = value
+        self.static = False
+        self.static_val = None
 
     def __deepcopy__(self, memo=None):
         return self
@@ -490,6 +641,10 @@ class Literal(Node):
 
 class Number(Node):
     "Numeric literal"
+    __slots__ = ("value",)
+    kind = KIND_NUMBER
+    static = True
+
     def __init__(self, value):
         try:
             self.value = float(value)
@@ -525,6 +680,10 @@ class Number(Node):
 
 class Constant(Node):
     "Used for true, false, null"
+    __slots__ = ("value",)
+    kind = KIND_CONSTANT
+    static = True
+
     def __init__(self, value):
         self.value = value
 
@@ -555,8 +714,18 @@ class Constant(Node):
         return self.value
 
 
+# Shared constants used when rewriting the AST. Constants
+# from the parser are created separately, since they carry
+# their own position.
+TRUE = Constant(True)
+FALSE = Constant(False)
+
+
 class Undefined(Node):
     "Represents a non-defined object"
+    __slots__ = ()
+    kind = KIND_UNDEFINED
+
     def __init__(self):
         return
 
@@ -595,8 +764,15 @@ class Undefined(Node):
         return self
 
 
+# Shared undefined value returned by failed resolutions
+UNDEFINED = Undefined()
+
+
 class Empty(Node):
     "Represents the null set"
+    __slots__ = ()
+    kind = KIND_EMPTY
+
     def __init__(self):
         return
 
@@ -629,10 +805,16 @@ class Empty(Node):
 
 class PushResult(Node):
     "Special node class used to push results for PredicateSets"
+    __slots__ = ("pred", "left")
+    kind = KIND_PUSH_RESULT
+
     def __init__(self, predicate, ast):
         self.pred = predicate
         self.left = ast
 
+    def children(self):
+        return (self.left,)
+
     def __deepcopy__(self, memo=None):
         # Do not copy the predicate
         return PushResult(self.pred, dup(self.left))
@@ -661,11 +843,18 @@ class Branch(Node):
     the right branch. This allows for a single evaluation
     of a term to prune other unnecessary checks.
     """
+    __slots__ = ("expr", "left", "right")
+    kind = KIND_BRANCH
+
     def __init__(self, expr, left, right):
         self.expr = expr
         self.left = left
         self.right = right
 
+    def children(self):
+        # Either branch may be missing
+        return tuple(n for n in (self.left, self.right) if n is not None)
+
     def name(self):
         return "Branch on %s" % self.expr.name()
 
@@ -719,10 +908,19 @@ class Both(Node):
     It is used instead of OR trees since it does not
     short-circuit the evaluation.
     """
+    __slots__ = ("left", "right")
+    kind = KIND_BOTH
+
     def __init__(self, left, right):
         self.left = left
         self.right = right
 
+    def children(self):
+        return (self.left, self.right)
+
+    def __deepcopy__(self, memo=None):
+        return Both(deepcopy(self.left, memo), deepcopy(self.right, memo))
+
     def name(self):
         "Provides human name with location"
         return self.__class__.__name__
@@ -745,6 +943,9 @@ class CachedNode(Node):
     predicates are merged and share expressions that are
     not refactored into a branch.
     """
+    __slots__ = ("expr", "cache_id")
+    kind = KIND_CACHED
+
     def __init__(self, left, cache_id):
         self.expr = left
         self.cache_id = cache_id
@@ -789,17 +990,111 @@ class CachedNode(Node):
             self.expr.failure_info(ctx)
 
 
+class IndexedDispatch(Node):
+    """
+    Special node class used for Predicate Sets. It evaluates
+    an expression once, and uses the value to look up the
+    predicates that match from a table. This replaces comparing
+    the same expression against a static value once per predicate.
+    The original PushResult nodes are kept in checks. They are
+    evaluated instead when the value is not one of the builtin
+    DISPATCH_TYPES, and when analyzing so that every predicate
+    reports its own failure reason.
+    """
+    __slots__ = ("expr", "table", "checks")
+    kind = KIND_DISPATCH
+
+    def __init__(self, expr, table, checks):
+        self.expr = expr
+        self.table = table
+        self.checks = checks
+
+    def __deepcopy__(self, memo=None):
+        return self
+
+    def name(self):
+        return "IndexedDispatch on %s" % self.expr.name()
+
+    def description(self, buf=None, depth=0, max_depth=0):
+        """
+        Provides a human readable tree description
+        """
+        if not buf:
+            buf = ""
+        pad = depth * "\t"
+        if max_depth and depth == max_depth:
+            buf += pad + "...\n"
+            return buf
+
+        buf += pad + self.name() + "\n"
+        for value in sorted(self.table, key=repr):
+            for pred in self.table[value]:
+                buf += pad + "\t%s pushes '%s'\n" % (repr(value), pred.predicate)
+        return buf
+
+    def eval(self, ctx):
+        if not ctx.analyze:
+            value = self.expr.eval(ctx)
+            if type(value) in DISPATCH_TYPES:
+                # Every predicate is reached, as with the PushResults
+                ctx.reach += len(self.checks)
+                preds = self.table.get(value)
+                if not preds:
+                    return False
+                for pred in preds:
+                    ctx.pred.push_match(pred)
+                return True
+
+        # Evaluate each predicate on its own, so that values with
+        # their own equality match, and analyze gets the reasons
+        matched = False
+        for check in self.checks:
+            if check.eval(ctx):
+                matched = True
+        return matched
+
+
 class LiteralSet(Node):
     """
     This node represents a 'set' of values. It is constructed
     as a literal in the predicate and is used for things like
     contains.
     """
-    static = False
-    static_val = None
+    __slots__ = ("_value", "_evaluated", "_raw", "_keys", "static", "static_val")
+    kind = KIND_LITERAL_SET
 
     def __init__(self, value):
         self.value = frozenset(value)
+        self.static = False
+        self.static_val = None
+
+    def _get_value(self):
+        return self._value
+
+    def _set_value(self, value):
+        # Split the items into the literals that need to be resolved,
+        # along with undefined and empty which have no raw value, and
+        # the raw values of everything else, so that evaluation does
+        # not need to inspect every item.
+        self._value = value
+        self._evaluated = tuple(i for i in value
+                if isinstance(i, (Literal, Undefined, Empty)))
+        self._raw = frozenset(i.value for i in value
+                if not isinstance(i, (Literal, Undefined, Empty)))
+        self._keys = None
+
+    value = property(_get_value, _set_value)
+
+    def keys(self):
+        """
+        Returns a frozenset of (kind, value) keys for the items.
+        These hash without invoking the node methods, and are
+        cached until the value is changed.
+        """
+        if self._keys is None:
+            self._keys = frozenset((i.kind, getattr(i, "value", None))
+                    for i in self._value)
+        return self._keys
 
     def name(self):
         return "Set of %s" % repr(self.value)
@@ -819,6 +1114,8 @@ class LiteralSet(Node):
                     static_val.add(item.static_val)
                 else:
                     static = False
+            elif isinstance(item, (Undefined, Empty)):
+                static_val.add(item)
             else:
                 static_val.add(item.value)
 
@@ -858,12 +1155,8 @@ class LiteralSet(Node):
             return self.static_val
 
         # Non-static set requires resolution of each literal value
-        s = set([])
-        for i in self.value:
-            if isinstance(i, Literal):
-                v = i.eval(ctx)
-            else:
-                v = i.value
-            s.add(v)
+        s = set(self._raw)
+        for i in self._evaluated:
+            s.add(i.eval(ctx))
         return frozenset(s)
 
@@ -6,6 +6,8 @@ make other inferences. For example, if we assume "a > b",
 then we know that "b < a", "b <=a" are both true, and
 we can safely rewrite that as a constant.
 """
+import operator
+
 from . import ast
 from . import util
 from .tiler import ASTPattern, SimplePattern, tile
@@ -13,6 +15,56 @@ from .tiler import ASTPattern, SimplePattern, tile
 EQUALITY = ("=", "is")
 INEQUALITY = ("!=",)
 
+# Maps each ordering operator to a tuple of (less_than, or_equal)
+ORDER_OPS = {
+    "<": (True, False),
+    "<=": (True, True),
+    ">": (False, False),
+    ">=": (False, True),
+}
+
+# Maps an ordering operator to the operator that holds
+# when it is false. For example, not (a < b) -> a >= b
+ORDER_NEGATE = {
+    "<": ">=",
+    "<=": ">",
+    ">": "<=",
+    ">=": "<",
+}
+
+
+def order_implications():
+    """
+    Builds a table used to rewrite ordering comparisons against
+    numbers. Given that "a known_op b" holds, the table maps
+    (known_op, other_op, sign) to the value of "a other_op c", where
+    sign is the sign of (c - b). The value is None when it cannot
+    be determined. For example, if "a < 5" holds, then "a < 10"
+    is True, and "a > 10" is False, but "a > 0" is unknown.
+    """
+    funcs = {
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+    }
+
+    # With b fixed at 0 and c in (-1, 0, 1), these points sample
+    # every interval in which the comparisons are constant
+    points = [x / 2.0 for x in range(-4, 5)]
+
+    table = {}
+    for known_op, known_func in funcs.items():
+        possible = [a for a in points if known_func(a, 0)]
+        for other_op, other_func in funcs.items():
+            for sign in (-1, 0, 1):
+                results = set(other_func(a, sign) for a in possible)
+                value = results.pop() if len(results) == 1 else None
+                table[(known_op, other_op, sign)] = value
+    return table
+
+ORDER_IMPLIES = order_implications()
+
 
 def canonicalize(node):
     """
@@ -24,30 +76,60 @@ def canonicalize(node):
     refactoring expressions order independent.
     """
     def replace_func(pattern, n):
-        l_literal = isinstance(n.left, ast.Literal)
-        r_literal = isinstance(n.right, ast.Literal)
+        left = n.left
+        right = n.right
+        l_literal = left.kind == ast.KIND_LITERAL
+        r_literal = right.kind == ast.KIND_LITERAL
 
         # Always put the literal on the left
         if not l_literal and r_literal:
             n.reverse()
 
         elif l_literal and r_literal:
-            # Put static values on the right
-            if n.left.static and not n.right.static:
-                n.reverse()
+            l_static = left.static
+            r_static = right.static
 
-            # Put the literals in order (both non-static)
-            elif not n.left.static and not n.right.static and n.left.value > n.right.value:
+            # Put static values on the right
+            if l_static and not r_static:
                 n.reverse()
 
-            # Put the literals in order (both static)
-            elif n.left.static and n.right.static and n.left.value > n.right.value:
+            # Put the literals in order (both static or both non-static)
+            elif l_static == r_static and left.value > right.value:
                 n.reverse()
 
     p = SimplePattern("types:CompareOperator")
     return tile(node, [p], replace_func)
 
 
+def fold_static(node):
+    """
+    Rewrites comparisons between two static values into
+    a Constant, since they have the same result for every
+    document. For example, if "name" statically resolves
+    to "Joe", then the expression:
+        name = 'Joe'
+
+    can be replaced with true.
+    """
+    ctx = ast.EvalContext(None, None)
+
+    def replace_func(pattern, n):
+        if not (n.left.static and n.right.static):
+            return None
+
+        # Leave comparisons of incompatible types to fail
+        # at evaluation time
+        try:
+            result = n.eval(ctx)
+        except TypeError:
+            return None
+        return ast.TRUE if result else ast.FALSE
+
+    p = SimplePattern("types:CompareOperator",
+            "types:Literal,Number,Constant", "types:Literal,Number,Constant")
+    return tile(node, [p], replace_func)
+
+
 def select_rewrite_expression(name, exprs):
     """
     Given an expression name and a list of expressions,
@@ -102,6 +184,24 @@ def compare_rewrite(node, name, expr, assumed_result):
         assert False, "Unknown compare!"
 
 
+def memoize_replace(key_func, replace_func):
+    """
+    Wraps a replace function used for tiling so that it is
+    invoked only once per key. All the nodes sharing a key
+    get the same result, including the same Constant node.
+    The cache lives only as long as the returned function.
+    """
+    cache = {}
+    def wrapper(pattern, node):
+        key = key_func(node)
+        if key in cache:
+            return cache[key]
+        result = replace_func(pattern, node)
+        cache[key] = result
+        return result
+    return wrapper
+
+
 def equality_rewrite(node, name, expr, assumed_result):
     # Get the literal and static compare values
     static_value = expr.right.value
@@ -117,8 +217,9 @@ def equality_rewrite(node, name, expr, assumed_result):
     # Replace function to handle AST re-writes
     def replace_func(pattern, node):
         # Do the static comparison
-        static_match = node.right.value == static_value
-        is_static_node = node.right.static
+        right = node.right
+        static_match = right.value == static_value
+        is_static_node = right.static
 
         # If we are refactoring equality on a static
         # variable, then we can statically perform the comparisons
@@ -141,136 +242,82 @@ def equality_rewrite(node, name, expr, assumed_result):
                 const = not known
 
         # If we can't do a rewrite, just skip this node
-        return ast.Constant(const) if const is not None else None
+        if const is None:
+            return None
+        return ast.TRUE if const else ast.FALSE
+
+    # Nodes with the same operator and value are rewritten the same way
+    key_func = lambda n: (n.type, n.right.value, n.right.static)
 
     # Tile to replace
     pattern = SimplePattern("types:CompareOperator AND ops:=,!=,is", ASTPattern(expr.left))
-    return tile(node, [pattern], replace_func)
+    return tile(node, [pattern], memoize_replace(key_func, replace_func))
 
 
 def order_rewrite(node, name, expr, assumed_result):
-    # Get the literal and static compare values
-    static_value = expr.right.value
-    numeric = isinstance(expr.right, ast.Number)
-
-    # Based on the assumed result get the upper/lower bounds
-    less_than = "<" in expr.type
-    maybe_equals = "=" in expr.type
-    if less_than:
-        if assumed_result:
-            min_bound = float("-inf")
-            min_incl = False
-            max_bound = static_value
-            max_incl = maybe_equals
-        else:
-            min_bound = static_value
-            min_incl = not maybe_equals
-            max_bound = float("inf")
-            max_incl = False
+    # Determine the comparison that is known to hold
+    # based on the assumed result
+    known_op = expr.type if assumed_result else ORDER_NEGATE[expr.type]
+
+    # Dispatch on the type of the compare value
+    if expr.right.kind == ast.KIND_NUMBER:
+        return order_rewrite_numeric(node, expr, known_op)
     else:
-        if assumed_result:
-            min_bound = static_value
-            min_incl = maybe_equals
-            max_bound = float("inf")
-            max_incl = False
-        else:
-            min_bound = float("-inf")
-            min_incl = False
-            max_bound = static_value
-            max_incl = not maybe_equals
+        return order_rewrite_literal(node, expr, known_op)
 
-    if not assumed_result:
-        less_than = not less_than
-        maybe_equals = not maybe_equals
 
-    # Replace function to handle AST re-writes
+def order_rewrite_numeric(node, expr, known_op):
+    """
+    Rewrites ordering comparisons against numbers, given
+    that the expression with the known_op operator holds.
+    """
+    static_value = expr.right.value
+
+    # Replace function to handle AST re-writes. Use the sign
+    # of the difference in values to look up the implication.
     def replace_func(pattern, node):
         node_val = node.right.value
-        if not numeric and node_val != static_value:
+        sign = (node_val > static_value) - (node_val < static_value)
+        const = ORDER_IMPLIES[(known_op, node.type, sign)]
+
+        # No replacement in some situations
+        if const is None:
             return None
+        return ast.TRUE if const else ast.FALSE
 
-        # Check what this node is asserting
-        assert_less = "<" in node.type
-        assert_equals = "=" in node.type
+    # Nodes with the same operator and value are rewritten the same way
+    key_func = lambda n: (n.type, n.right.value)
 
-        # For literals, check that assertions match
-        if not numeric:
-            const = (less_than == assert_less)
-            if maybe_equals:
-                const = const and assert_equals
+    # Tile to replace
+    pattern = SimplePattern("types:CompareOperator AND ops:<,<=,>,>=",
+            ASTPattern(expr.left), "types:Number")
+    return tile(node, [pattern], memoize_replace(key_func, replace_func))
 
-        # For numerics we can do static analysis
-        else:
-            # Some cases cannot be re-written
-            const = None
-            if assert_less:
-                # a < c, c > b iff a < b
-                if node_val > max_bound:
-                    const = True
-
-                # a <= c, c = b iff a <= b
-                # a < c, c = b iff a <= b UNKNOWN!
-                elif node_val == max_bound and max_incl and assert_equals:
-                    const = True
-
-                # a < c, c == b, a < b
-                # a <= c, c == b, a < b
-                elif node_val == max_bound and not max_incl:
-                    const = True
-
-                # a < 5, a > 6
-                elif node_val < min_bound:
-                    const = False
-
-                # a < 5, a > 5
-                # a < 5, a >= 5
-                elif node_val == min_bound and not assert_equals:
-                    const = False
-
-                # a <= 5, a > 5
-                # a <= 5, a >= 5 UNKNOWN!
-                elif node_val == min_bound and assert_equals and \
-                    not min_incl:
-                    const = False
 
-            else:
-                # a > c, c < b iff a > b
-                if node_val < min_bound:
-                    const = True
-
-                # a >= c, c = b iff a > b
-                # a > c, c = b iff a > b
-                elif node_val == min_bound and not min_incl:
-                    const = True
-
-                # a >= c, c = b iff a >= b
-                # a > c, c = b iff a >= b UNKNOWN!
-                elif node_val == min_bound and min_incl and assert_equals:
-                    const = True
-
-                # a > c, c > b iff a < b
-                elif node_val > max_bound:
-                    const = False
-
-                # a > 5, a < 5
-                # a > 5, a <= 5
-                elif node_val == max_bound and not assert_equals:
-                    const = False
-
-                # a >= 5, a < 5
-                # a >= 5, a <= 5 UNKNOWN!
-                elif node_val == max_bound and assert_equals and \
-                    not max_incl:
-                    const = False
+def order_rewrite_literal(node, expr, known_op):
+    """
+    Rewrites ordering comparisons against literals, given
+    that the expression with the known_op operator holds.
+    """
+    static_value = expr.right.value
+    less_than, maybe_equals = ORDER_OPS[known_op]
 
-        # No replacement in some situations
-        if const is None:
+    # Replace function to handle AST re-writes. Only
+    # comparisons against the same literal can be checked.
+    def replace_func(pattern, node):
+        if node.right.value != static_value:
             return None
-        return ast.Constant(const)
+        assert_less, assert_equals = ORDER_OPS[node.type]
+        const = (less_than == assert_less)
+        if maybe_equals:
+            const = const and assert_equals
+        return ast.TRUE if const else ast.FALSE
 
+    # Nodes with the same operator and value are rewritten the same way
+    key_func = lambda n: (n.type, n.right.value)
 
     # Tile to replace
     pattern = SimplePattern("types:CompareOperator AND ops:<,<=,>,>=",
-            ASTPattern(expr.left), "types:Number" if numeric else "types:Literal")
-    return tile(node, [pattern], replace_func)
+            ASTPattern(expr.left), "types:Literal")
+    return tile(node, [pattern], memoize_replace(key_func, replace_func))
 
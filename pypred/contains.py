@@ -18,8 +18,8 @@ def select_rewrite_expression(settings, name, exprs):
     tries to select an expression with the highest selectivity
     for use in AST re-writing.
     """
-    # Get all the sets
-    sets = [e.left.value for e in exprs]
+    # Get the keys of all the sets
+    sets = [e.left.keys() for e in exprs]
 
     # Count the occurances of each element
     counts = defaultdict(int)
@@ -60,31 +60,34 @@ def contains_rewrite(node, name, expr, assumed_result):
     # Replace function to handle AST re-writes
     def replace_func(pattern, node):
         # Determine the subset based on the assumed result
+        node_set = node.left.value
         if assumed_result is True:
-            set_prime = node.left.value & expr_set
+            set_prime = node_set & expr_set
 
             # If this set is a super-set of the expression,
-            # then we can re-write to true
-            if set_prime == expr_set:
-                return ast.Constant(True)
+            # then we can re-write to true. The intersection is
+            # a subset of the expression, so the sizes are enough
+            # and we avoid comparing every item.
+            if len(set_prime) == len(expr_set):
+                return ast.TRUE
 
             # If there is no overlap, we are false
             elif len(set_prime) == 0:
-                return ast.Constant(False)
+                return ast.FALSE
 
             # Check if the set difference is smaller, and use negate
-            set_prime_diff = expr_set - node.left.value
+            set_prime_diff = expr_set - node_set
             if len(set_prime_diff) < len(set_prime):
                 node.left.value = set_prime_diff
                 return ast.NegateOperator(node)
 
         else:
-            set_prime = node.left.value - expr_set
+            set_prime = node_set - expr_set
 
             # If we end up with the empty set
             # meaning subset, then its false
             if len(set_prime) == 0:
-                return ast.Constant(False)
+                return ast.FALSE
 
         # Alter the set we are checking
         node.left.value = set_prime
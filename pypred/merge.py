@@ -19,6 +19,10 @@ from .tiler import ASTPattern, SimplePattern, tile
 
 CACHE_PATTERNS = None
 
+# Minimum number of predicates checking the same literal
+# before they are replaced with an IndexedDispatch
+MIN_DISPATCH = 4
+
 class RefactorSettings():
     def __init__(self, max_depth, min_select, max_opt_pass, min_change, min_density):
         """
@@ -51,7 +55,9 @@ class RefactorSettings():
 
         self.static_rewrite = True
         self.canonicalize = True
+        self.fold_static = True
         self.initial_optimize = True
+        self.dispatch = True
         self.refactor = True
         self.compact = True
         self.cache_expr = True
@@ -107,7 +113,11 @@ def merge(predicates):
     predicates, and Both nodes to combine.
     """
     # Merge the AST tree's together first using a tree
-    all_asts = [ast.PushResult(p, dup(p.ast)) for p in predicates]
+    return combine([ast.PushResult(p, dup(p.ast)) for p in predicates])
+
+
+def combine(all_asts):
+    "Combines a list of AST trees into a tree of Both nodes"
     while len(all_asts) > 1:
         merged = []
         end = len(all_asts)
@@ -118,8 +128,6 @@ def merge(predicates):
                 both = ast.Both(all_asts[x], all_asts[x+1])
                 merged.append(both)
         all_asts = merged
-
-    # The root object has everything
     return all_asts[0]
 
 
@@ -143,10 +151,18 @@ def refactor(pred_set, ast, settings=None):
     if settings.canonicalize:
         ast = compare.canonicalize(ast)
 
+    # Replace comparisons of static values with constants
+    if settings.fold_static:
+        ast = compare.fold_static(ast)
+
     # Do an initial optimization pass for easy wins
     if settings.initial_optimize:
         ast = optimize(ast, settings.max_opt_pass, settings.min_change)
 
+    # Look up the predicates that only check for equality
+    if settings.dispatch:
+        ast = index_equality(ast)
+
     # Recursively rebuild the tree to optimize cost
     if settings.refactor:
         ast = recursive_refactor(ast, settings)
@@ -167,6 +183,79 @@ def refactor(pred_set, ast, settings=None):
     return ast
 
 
+def index_equality(node, min_count=MIN_DISPATCH):
+    """
+    Replaces the predicates that only compare the same
+    literal against a static value, such as:
+        name is 'Jack' / name is 'Jill'
+
+    with an IndexedDispatch that resolves the literal once
+    and looks up the matching predicates. This is only done
+    for predicates at the root of the merged tree, and when
+    there are at least min_count predicates for a literal.
+    """
+    # Collect the results that are combined at the root
+    results = []
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n.kind == ast.KIND_BOTH:
+            stack.append(n.right)
+            stack.append(n.left)
+        else:
+            results.append(n)
+
+    # Group the equality checks by literal
+    groups = defaultdict(list)
+    for n in results:
+        key = dispatch_key(n)
+        if key is not None:
+            groups[key[0]].append((key[1], n))
+
+    # Build a table for each large enough group
+    dispatched = set()
+    dispatch_nodes = []
+    for name, checks in groups.items():
+        if len(checks) < min_count:
+            continue
+        table = {}
+        for value, n in checks:
+            table.setdefault(value, []).append(n.pred)
+            dispatched.add(id(n))
+        literal = checks[0][1].left.left
+        originals = [n for _, n in checks]
+        dispatch_nodes.append(ast.IndexedDispatch(literal, table, originals))
+
+    if not dispatch_nodes:
+        return node
+    remaining = [n for n in results if id(n) not in dispatched]
+    return combine(remaining + dispatch_nodes)
+
+
+def dispatch_key(node):
+    """
+    Returns a tuple of (literal name, static value) if the
+    node pushes a predicate that only compares a literal
+    for equality against a static value, otherwise None.
+    """
+    if node.kind != ast.KIND_PUSH_RESULT:
+        return None
+    expr = node.left
+    if expr.kind != ast.KIND_COMPARE or expr.type not in compare.EQUALITY:
+        return None
+
+    # The canonical form puts the static value on the right
+    left = expr.left
+    right = expr.right
+    if left.kind != ast.KIND_LITERAL or left.static:
+        return None
+    if right.kind == ast.KIND_LITERAL and right.static:
+        return (left.value, right.static_val)
+    elif right.kind == ast.KIND_NUMBER or right.kind == ast.KIND_CONSTANT:
+        return (left.value, right.value)
+    return None
+
+
 def static_resolution(ast, pred):
     "Attempts to statically resolve all literals."
     def resolve_func(pattern, literal):
@@ -274,7 +363,7 @@ def rewrite_ast(node, name, expr, assumed_result):
 
     else:
         # Tile over the AST and replace the expresssion
-        const = ast.Constant(assumed_result)
+        const = ast.TRUE if assumed_result else ast.FALSE
         func = lambda p, n: const
         pattern = ASTPattern(expr)
         return tile(node, [pattern], func)
@@ -289,68 +378,64 @@ def count_expressions(node):
     Returns a tuple of (counts, names). The counts maps
     names to counts, and the names maps the name to AST nodes.
     """
-    counts = defaultdict(int)
     nodes = defaultdict(list)
 
     def count_func(pattern, node):
         "Invoked to count a new pattern being matched"
         # Convert to a hashable name
-        enable_static = isinstance(node, ast.CompareOperator)
+        enable_static = node.kind == ast.KIND_COMPARE
         name = node_name(node, enable_static)
 
-        # Increment the counter value for this expression and store the nodes
-        counts[name] += 1
+        # Store the nodes for this expression
         nodes[name].append(node)
 
-    # Return the counts
+    # Derive the counts from the stored nodes, so that
+    # each matched name is only hashed once while tiling
     tile(node, count_patterns(), count_func)
+    counts = defaultdict(int)
+    for name, matched in nodes.items():
+        counts[name] = len(matched)
     return counts, nodes
 
 
 def node_name(node, enable_static=False):
     "Returns a hashable name that can be used for counting"
-    cls_name = node.__class__.__name__
-    if cls_name == "Literal":
+    kind = node.kind
+    if kind == ast.KIND_LITERAL:
         if enable_static and node.static:
-            return (cls_name, "static")
+            return ("Literal", "static")
         else:
-            return (cls_name, node.value)
+            return ("Literal", node.value)
 
-    elif cls_name == "LiteralSet":
-        return cls_name
+    elif kind == ast.KIND_LITERAL_SET:
+        return "LiteralSet"
 
-    elif cls_name == "Number":
+    elif kind == ast.KIND_NUMBER:
         if enable_static:
-            return (cls_name, "static")
+            return ("Number", "static")
         else:
-            return (cls_name, node.value)
+            return ("Number", node.value)
 
-    elif cls_name in ("Constant","Regex"):
-        return (cls_name, node.value)
+    elif kind == ast.KIND_CONSTANT or kind == ast.KIND_REGEX:
+        return (node.__class__.__name__, node.value)
 
-    elif cls_name in ("Undefined", "Empty"):
-        return cls_name
+    elif kind == ast.KIND_UNDEFINED or kind == ast.KIND_EMPTY:
+        return node.__class__.__name__
 
-    elif cls_name == "NegateOperator":
+    elif kind == ast.KIND_NEGATE:
         # Return the name of the sub-expression, since if
         # we do a constant re-write of that, the optimizer
         # can replace the negate operator
         return node_name(node.left)
 
-    elif cls_name == "CompareOperator":
+    elif kind == ast.KIND_COMPARE:
         if enable_static:
-            n_type = node.type
-            if n_type in ("=", "!=", "is"):
-                type = "equality"
-            elif n_type in (">", ">=", "<", "<="):
-                type = "order"
-            else:
-                type = n_type
+            type = node.category
         else:
             type = node.type
-        return (cls_name, type, node_name(node.left, enable_static), node_name(node.right, enable_static))
+        return ("CompareOperator", type, node_name(node.left, enable_static), node_name(node.right, enable_static))
 
-    elif cls_name == "LogicalOperator":
+    elif kind == ast.KIND_LOGICAL:
         # Return the name of the literal sub-expression, since
         # the optimizer can use that to remove the logical operator
         l_name = node_name(node.left)
@@ -359,10 +444,10 @@ def node_name(node, enable_static=False):
         else:
             return node_name(node.right)
 
-    elif cls_name in ("MatchOperator", "ContainsOperator"):
-        return (cls_name, node_name(node.left), node_name(node.right))
+    elif kind == ast.KIND_MATCH or kind == ast.KIND_CONTAINS:
+        return (node.__class__.__name__, node_name(node.left), node_name(node.right))
     else:
-        raise Exception("Unhandled class %s" % cls_name)
+        raise Exception("Unhandled class %s" % node.__class__.__name__)
 
 
 def count_patterns():
@@ -5,7 +5,6 @@ re-writing to do simple optimizations.
 from functools import partial
 from .tiler import tile, Pattern, SimplePattern
 from . import ast
-import collections
 
 CACHE_PATTERNS = None
 
@@ -15,19 +14,25 @@ def optimize(node, max_pass=32, min_change=1):
     Takes an AST and returns one that is equivilent
     but optimized.
     """
+    # Track the sub-trees without any possible optimizations,
+    # so that each pass only revisits the parts that changed
+    clean = {}
     changes = min_change
     passes = 0
     while passes < max_pass and changes >= min_change:
-        changes, node = optimization_pass(node)
+        changes, node = optimization_pass(node, clean)
         passes += 1
     return node
 
 
-def optimization_pass(node):
+def optimization_pass(node, clean=None):
     """
     Does a single optimization pass.
     Returns (changes, ast). The number of changes
     should converge to 0 with enough passes.
+
+    The optional clean dictionary is used to skip
+    sub-trees that were unchanged in a previous pass.
     """
     # Get a partial application of the optimization function
     info = {'c': 0}
@@ -35,7 +40,7 @@ def optimization_pass(node):
 
     # Tile over the ast
     patterns = optimization_patterns()
-    node = tile(node, patterns, func)
+    node = tile(node, patterns, func, clean)
 
     # Return the counts
     return info['c'], node
@@ -44,7 +49,7 @@ def optimization_pass(node):
 def optimization_func(info, pattern, node):
     "Invoked to count an applied optimization and to replace"
     info['c'] += 1
-    if isinstance(pattern.replacement, collections.Callable):
+    if callable(pattern.replacement):
         return pattern.replacement(node)
     else:
         return pattern.replacement
@@ -58,32 +63,32 @@ def optimization_patterns():
 
     # Replace and AND with a False value with False
     p1 = SimplePattern("types:LogicalOperator AND op:and", "types:Constant AND value:False")
-    p1.replacement = ast.Constant(False)
+    p1.replacement = ast.FALSE
 
     p2 = SimplePattern("types:LogicalOperator AND op:and", None, "types:Constant AND value:False")
-    p2.replacement = ast.Constant(False)
+    p2.replacement = ast.FALSE
 
     # Replace OR with a True value with True
     p3 = SimplePattern("types:LogicalOperator AND op:or", "types:Constant AND value:True")
-    p3.replacement = ast.Constant(True)
+    p3.replacement = ast.TRUE
 
     p4 = SimplePattern("types:LogicalOperator AND op:or", None, "types:Constant AND value:True")
-    p4.replacement = ast.Constant(True)
+    p4.replacement = ast.TRUE
 
     # Replace a simple negation
     p5 = SimplePattern("types:NegateOperator", "types:Constant AND value:True")
-    p5.replacement = ast.Constant(False)
+    p5.replacement = ast.FALSE
 
     p6 = SimplePattern("types:NegateOperator", "types:Constant AND value:False")
-    p6.replacement = ast.Constant(True)
+    p6.replacement = ast.TRUE
 
     # Remove a no-op push result
     p7 = SimplePattern("types:PushResult", "types:Constant AND value:False")
-    p7.replacement = ast.Constant(False)
+    p7.replacement = ast.FALSE
 
     # Remove Both nodes when possible
     p8 = SimplePattern("types:Both", "types:Constant AND value:False", "types:Constant AND value:False")
-    p8.replacement = ast.Constant(False)
+    p8.replacement = ast.FALSE
 
     # Special pattern that replaces Both with one of the children
     p9 = ExtraBothPattern()
@@ -100,7 +105,7 @@ def optimization_patterns():
 
     # Replace "Empty contains *" with False
     p13 = SimplePattern("types:ContainsOperator", "types:Empty,Undefined")
-    p13.replacement = ast.Constant(False)
+    p13.replacement = ast.FALSE
 
     # Remove empty sets (python3)
     p14 = SimplePattern("types:LiteralSet AND value:frozenset()")
@@ -116,6 +121,8 @@ class ExtraBothPattern(Pattern):
     of the children is a no-op. This allows the Both
     to be replaced with one child.
     """
+    types = frozenset(["Both"])
+
     def matches(self, node):
         if not isinstance(node, ast.Both):
             return False
@@ -149,6 +156,8 @@ class ShortCircuitLogicalPattern(Pattern):
     For example true and expr can be replace with expr,
     or false or expr could be replaced with expr.
     """
+    types = frozenset(["LogicalOperator"])
+
     def matches(self, node):
         if not isinstance(node, ast.LogicalOperator):
             return False
@@ -189,6 +198,8 @@ class DeadBranchPattern(Pattern):
     This pattern detects when there is a dead branch that
     is unreachable. It replaces it with the proper live branch.
     """
+    types = frozenset(["Branch"])
+
     def matches(self, node):
         if not isinstance(node, ast.Branch):
             return False
@@ -199,7 +210,7 @@ class DeadBranchPattern(Pattern):
     def replacement(self, node):
         branch = node.expr.value
         if branch:
-            return node.left if node.left else ast.Constant(False)
+            return node.left if node.left else ast.FALSE
         else:
-            return node.right if node.right else ast.Constant(False)
+            return node.right if node.right else ast.FALSE
 
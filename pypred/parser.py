@@ -5,6 +5,7 @@ to parse the grammars
 ###
 # Implements the lexer
 ###
+import re
 import ply.lex as lex
 
 reserved = {
@@ -110,19 +111,162 @@ def t_error(t):
         t.lexer.errors.append(error_loc)
         t.lexer.skip(1)
 
+# Maps the operator rules to their token types. These
+# are checked before the single character operators.
+OPERATORS = {
+    '>=': 'GREATER_THAN_EQUALS',
+    '<=': 'LESS_THAN_EQUALS',
+    '==': 'DBL_EQUALS',
+    '!=': 'NOT_EQUALS',
+    '>': 'GREATER_THAN',
+    '<': 'LESS_THAN',
+    '=': 'EQUALS',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '{': 'LBRACK',
+    '}': 'RBRACK',
+}
+
+# Matches either a number or a string, with the number taking
+# priority as it does in the rule order above
+WORD_RE = re.compile("(?P<NUMBER>%s)|(?P<STRING>%s)" % \
+        (t_NUMBER.__doc__, t_STRING.__doc__))
+
+# Maps the matched group to the token type and rule. The type
+# is the constant from the token list, rather than the group
+# name of the match, so token types are always interned.
+WORD_RULES = {}
+for _type, _rule in (('NUMBER', t_NUMBER), ('STRING', t_STRING)):
+    WORD_RULES[WORD_RE.groupindex[_type]] = (_type, _rule)
+
+COMMENT_RE = re.compile(t_ignore_COMMENT)
+NEWLINE_RE = re.compile(t_newline.__doc__)
+
+
+class Lexer(object):
+    """
+    Scanner that produces the same tokens and errors as a
+    PLY lexer built from the rules above. Instead of matching
+    a master regex and dispatching on the rule index, it
+    dispatches on the next character, and only uses a regex
+    for numbers, strings and comments.
+    """
+    def __init__(self):
+        self.lexdata = None
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lineno = 1
+        self.errors = []
+
+    def input(self, s):
+        "Sets the input string to tokenize"
+        self.lexdata = s
+        self.lexpos = 0
+        self.lexlen = len(s)
+
+    def skip(self, n):
+        "Skips n characters of the input"
+        self.lexpos += n
+
+    def token(self):
+        "Returns the next token, or None at the end of the input"
+        data = self.lexdata
+        pos = self.lexpos
+        end = self.lexlen
+
+        while pos < end:
+            c = data[pos]
+            if c in t_ignore:
+                pos += 1
+                continue
+
+            # Track the newlines
+            if c == "\n":
+                m = NEWLINE_RE.match(data, pos)
+                self.lineno += m.end() - pos
+                pos = m.end()
+                continue
+
+            # Ignore any comments
+            if c == "#":
+                pos = COMMENT_RE.match(data, pos).end()
+                continue
+
+            # Check for the operators, longest first
+            op = data[pos:pos+2]
+            if op in OPERATORS:
+                type = OPERATORS[op]
+            else:
+                op = c
+                type = OPERATORS.get(c)
+            if type:
+                tok = lex.LexToken()
+                tok.type = type
+                tok.value = op
+                tok.lineno = self.lineno
+                tok.lexpos = pos
+                self.lexpos = pos + len(op)
+                return tok
+
+            # Check for a number or string
+            m = WORD_RE.match(data, pos)
+            if m:
+                type, rule = WORD_RULES[m.lastindex]
+                tok = lex.LexToken()
+                tok.type = type
+                tok.value = m.group()
+                tok.lineno = self.lineno
+                tok.lexpos = pos
+                tok.lexer = self
+                self.lexpos = m.end()
+                return rule(tok)
+
+            # Invoke the error handler, which must skip ahead
+            tok = lex.LexToken()
+            tok.type = 'error'
+            tok.value = data[pos:]
+            tok.lineno = self.lineno
+            tok.lexpos = pos
+            tok.lexer = self
+            self.lexpos = pos
+            t_error(tok)
+            if self.lexpos == pos:
+                raise lex.LexError("Scanning error. Illegal character '%s'" % c, data[pos:])
+            pos = self.lexpos
+
+        self.lexpos = pos + 1
+        if data is None:
+            raise RuntimeError('No input string given with input()')
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        t = self.token()
+        if t is None:
+            raise StopIteration
+        return t
+
+    # Python 2 legacy
+    next = __next__
+
+
 # Build the lexer
 def get_lexer():
     "Returns a new instance of the lexer"
-    l = lex.lex()
-    l.errors = []
-    return l
+    return Lexer()
 
 ###
 # Implements the parser
 ###
+import copy
 import ply.yacc as yacc
 from . import ast
 
+# Cached parsers by debug level, copied for each use
+CACHE_PARSERS = {}
+
 precedence = (
     ('right', 'AND', 'OR'),
     ('right', 'NOT'),
@@ -248,7 +392,12 @@ def p_error(p):
 
 def get_parser(lexer=None, debug=0):
     "Returns a new instance of the parser"
-    p = yacc.yacc(debug=debug)
+    if debug not in CACHE_PARSERS:
+        CACHE_PARSERS[debug] = yacc.yacc(debug=debug)
+
+    # The parse tables are read-only and can be shared,
+    # while the parse state is reset on each parse.
+    p = copy.copy(CACHE_PARSERS[debug])
     p.errors = []
     if lexer:
         lexer.parser = p
@@ -1,6 +1,6 @@
+from copy import deepcopy
 from .parser import get_lexer, get_parser
 from . import ast
-import collections
 
 # python2/3 basestring compatibility
 try:
@@ -8,11 +8,89 @@ try:
 except NameError: # python3
     basestring = (str, bytes)
 
+# Maximum number of parsed predicates to cache
+MAX_PARSE_CACHE = 1024
+
+# Caches the parse results of predicate strings
+CACHE_PARSE = {}
+
+# Maximum number of identifier paths to cache
+MAX_PATH_CACHE = 4096
+
+# Caches the parts of dotted identifiers
+CACHE_PATHS = {}
+
+
 class InvalidPredicate(Exception):
     "Raised for evaluation of an invalid predicate"
     pass
 
 
+def parse(predicate, debug=0):
+    """
+    Parses a predicate string. Returns a tuple of
+    (ast, lexer errors, parser errors, ast errors).
+    The ast is None and the ast errors are set if
+    the parse failed.
+    """
+    lexer = get_lexer()
+    p = get_parser(lexer=lexer, debug=debug)
+    try:
+        return (p.parse(predicate, lexer=lexer), lexer.errors, p.errors, None)
+    except (Exception) as e:
+        return (None, lexer.errors, p.errors, {"errors": [str(e)], "regex": {}})
+
+
+def cached_parse(predicate, debug=0):
+    """
+    Parses a predicate string like parse, but re-uses the
+    results of previous parses of the same string. A copy
+    of the results is returned, so they can be modified.
+    """
+    # Debug parses are not cached, since they produce output
+    if debug:
+        return parse(predicate, debug)
+
+    res = CACHE_PARSE.get(predicate)
+    if res is None:
+        res = parse(predicate)
+        if len(CACHE_PARSE) >= MAX_PARSE_CACHE:
+            CACHE_PARSE.clear()
+        CACHE_PARSE[predicate] = res
+
+    tree, lexer_errors, parser_errors, ast_errors = res
+    if tree is not None:
+        tree = copy_ast(tree)
+    if ast_errors is not None:
+        ast_errors = {"errors": list(ast_errors["errors"]), "regex": {}}
+    return (tree, list(lexer_errors), list(parser_errors), ast_errors)
+
+
+def copy_ast(node):
+    """
+    Copies an AST like ast.dup, but does not share the
+    literals with the original, since they are modified
+    in place by static resolution.
+    """
+    # Map each literal to a new copy for deepcopy to use
+    memo = {}
+    def copy_literal(lit):
+        if id(lit) not in memo:
+            new = ast.Literal(lit.value)
+            new.position = lit.position
+            memo[id(lit)] = new
+
+    for n in node.iter_pre():
+        if isinstance(n, ast.Literal):
+            copy_literal(n)
+        elif isinstance(n, ast.LiteralSet):
+            for item in n.value:
+                if isinstance(item, ast.Literal):
+                    copy_literal(item)
+
+    return deepcopy(node, memo)
+
+
 class LiteralResolver(object):
     "Mixin to provide literal resolution"
     def __init__(self):
@@ -37,7 +115,7 @@ class LiteralResolver(object):
         if identifier[0] == identifier[-1] and identifier[0] in ("'", "\""):
             return identifier[1:-1]
 
-        return ast.Undefined()
+        return ast.UNDEFINED
 
     def resolve_identifier(self, document, identifier):
         """
@@ -55,8 +133,13 @@ class LiteralResolver(object):
 
         # Allow the dot syntax for nested object lookup
         # i.e. req.sdk.version = req["sdk"]["version"]
-        if "." in identifier:
-            parts = identifier.split(".")
+        parts = CACHE_PATHS.get(identifier)
+        if parts is None:
+            parts = tuple(identifier.split(".")) if "." in identifier else ()
+            if len(CACHE_PATHS) >= MAX_PATH_CACHE:
+                CACHE_PATHS.clear()
+            CACHE_PATHS[identifier] = parts
+        if parts:
             found = True
             root = document
             for p in parts:
@@ -71,13 +154,13 @@ class LiteralResolver(object):
         # Check if there is a resolver
         if identifier in self.resolvers:
             relv = self.resolvers[identifier]
-            if isinstance(relv, collections.Callable):
+            if callable(relv):
                 return relv()
             else:
                 return relv
 
         # Return the undefined node if all else fails
-        return ast.Undefined()
+        return ast.UNDEFINED
 
 
 class Predicate(LiteralResolver):
@@ -110,25 +193,14 @@ class Predicate(LiteralResolver):
         # Store the predicate
         self.predicate = predicate
 
-        # Setup the lexer
-        lexer = get_lexer()
-        self.lexer_errors = lexer.errors
-
-        # Setup the parser
-        p = get_parser(lexer=lexer, debug=debug)
-        self.parser_errors = p.errors
-
         # Try to get the AST tree
-        try:
-            self.ast = p.parse(self.predicate, lexer=lexer)
-            self.ast_validated = False
-            self.ast_valid = False
-            self.ast_errors = None
-        except (Exception) as e:
-            self.ast = None
-            self.ast_validated = True
-            self.ast_valid = False
-            self.ast_errors = {"errors": [str(e)], "regex": {}}
+        self.ast, self.lexer_errors, self.parser_errors, self.ast_errors = \
+                cached_parse(self.predicate, debug)
+        self.ast_validated = self.ast_errors is not None
+        self.ast_valid = False
+
+        # Cache of the descriptions by maximum depth
+        self._descriptions = {}
 
         # Clear the error lists if empty
         if not self.lexer_errors:
@@ -194,7 +266,13 @@ class Predicate(LiteralResolver):
         "Provides a tree like human readable description of the predicate"
         if not self.is_valid():
             raise InvalidPredicate
-        return self.ast.description(max_depth=max_depth)
+
+        # The AST does not change, so each description is built once
+        desc = self._descriptions.get(max_depth)
+        if desc is None:
+            desc = self.ast.description(max_depth=max_depth)
+            self._descriptions[max_depth] = desc
+        return desc
 
     def evaluate(self, document):
         "Evaluates the predicate against the document."
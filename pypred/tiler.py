@@ -8,6 +8,10 @@ merging.
 
 class Pattern(object):
     "Base class for patterns. Always matches"
+    # Names of the node classes the pattern can match,
+    # or None if it can match any node
+    types = None
+
     def matches(self, node):
         "Returns if the current node matches the pattern"
         return True
@@ -16,26 +20,46 @@ class ASTPattern(Pattern):
     "Implements AST based pattern"
     def __init__(self, ast):
         self.ast = ast
+        self.types = frozenset([ast.__class__.__name__])
+        self.matcher = self.compile_matcher(ast)
 
     def matches(self, node):
         "Returns if the current node matches the ast"
-        return self.compare_nodes(self.ast, node)
+        return self.matcher(node)
 
     @classmethod
-    def compare_nodes(cls, a, b):
-        if a.__class__ != b.__class__:
-            return False
-        if hasattr(a, "value") and a.value != b.value:
-            return False
-        if hasattr(a, "type") and a.type != b.type:
-            return False
-        if hasattr(a, "left") and \
-            not cls.compare_nodes(a.left, b.left):
-            return False
-        if hasattr(b, "right") and \
-            not cls.compare_nodes(a.right, b.right):
-            return False
-        return True
+    def compile_matcher(cls, ast):
+        """
+        Generates a function that checks if a node matches the
+        given AST. A node matches if it has the same class, value
+        and type as the AST, and the same holds recursively for the
+        left and right nodes. The checks are unrolled into a single
+        expression, for example:
+            n.__class__ is _0 and n.type == _1 and n.left.__class__ is _2 ...
+
+        The classes and values of the AST are bound when the
+        function is generated.
+        """
+        env = {}
+        def bind(val):
+            name = "_%d" % len(env)
+            env[name] = val
+            return name
+
+        def checks(a, path):
+            terms = ["%s.__class__ is %s" % (path, bind(a.__class__))]
+            if hasattr(a, "value"):
+                terms.append("%s.value == %s" % (path, bind(a.value)))
+            if hasattr(a, "type"):
+                terms.append("%s.type == %s" % (path, bind(a.type)))
+            if hasattr(a, "left"):
+                terms.extend(checks(a.left, path + ".left"))
+            if hasattr(a, "right"):
+                terms.extend(checks(a.right, path + ".right"))
+            return terms
+
+        source = "lambda n: " + " and ".join(checks(ast, "n"))
+        return eval(source, env)
 
 class SimplePattern(Pattern):
     "Implements a simple DSL for patterns"
@@ -61,72 +85,82 @@ class SimplePattern(Pattern):
         self.left_p = left_p
         self.right_p = right_p
 
+        # Parse the patterns once into the checks to perform
+        self.types = self._pattern_types(node_p)
+        self.node_checks = self._compile_pattern(node_p)
+        self.left_checks = self._compile_pattern(left_p) if left_p else None
+        self.right_checks = self._compile_pattern(right_p) if right_p else None
+
     def matches(self, node):
         "Returns if the current node matches the pattern"
-        if not self._check_pattern(self.node_p, node):
-            return False
-        if self.left_p and not self._check_pattern(self.left_p, node.left):
-            return False
-        if self.right_p and not self._check_pattern(self.right_p, node.right):
-            return False
+        for check in self.node_checks:
+            if not check(node):
+                return False
+        if self.left_checks:
+            left = node.left
+            for check in self.left_checks:
+                if not check(left):
+                    return False
+        if self.right_checks:
+            right = node.right
+            for check in self.right_checks:
+                if not check(right):
+                    return False
         return True
 
     @classmethod
-    def _check_pattern(cls, pattern, node):
+    def _pattern_types(cls, pattern):
+        "Returns the node class names allowed by a pattern, or None"
+        if isinstance(pattern, Pattern):
+            return pattern.types
+        for clause in pattern.split(" AND "):
+            if clause.startswith("types:"):
+                return frozenset(clause[6:].split(","))
+        return None
+
+    @classmethod
+    def _compile_pattern(cls, pattern):
+        "Returns a tuple of functions that check each clause of a pattern"
         # Support sub-classes of pattern
         if isinstance(pattern, Pattern):
-            return pattern.matches(node)
+            return (pattern.matches,)
 
-        clauses = pattern.split(" AND ")
-        for clause in clauses:
+        checks = []
+        for clause in pattern.split(" AND "):
             # Check the node type
             if clause.startswith("types:"):
-                types = clause[6:].split(",")
-                if cls.node_type(node) not in types:
-                    return False
+                checks.append(cls._check_types(frozenset(clause[6:].split(","))))
 
             # Check the node op
             elif clause.startswith("op:"):
-                op = clause[3:]
-                if cls.node_op(node) != op:
-                    return False
+                checks.append(cls._check_ops(frozenset([clause[3:]])))
 
             # Check the node ops
             elif clause.startswith("ops:"):
-                ops = clause[4:].split(",")
-                if cls.node_op(node) not in ops:
-                    return False
+                checks.append(cls._check_ops(frozenset(clause[4:].split(","))))
 
-            # Check the node op
+            # Check the node value
             elif clause.startswith("value:"):
-                val = clause[6:]
-                if cls.node_value(node) != val:
-                    return False
+                checks.append(cls._check_value(clause[6:]))
 
             else:
                 raise Exception("Invalid pattern clause %s" % clause)
-        return True
+        return tuple(checks)
 
     @classmethod
-    def node_type(cls, node):
-        return node.__class__.__name__
+    def _check_types(cls, types):
+        return lambda node: node.__class__.__name__ in types
 
     @classmethod
-    def node_op(cls, node):
-        if hasattr(node, "type"):
-            return node.type
-        else:
-            return None
+    def _check_ops(cls, ops):
+        return lambda node: getattr(node, "type", None) in ops
 
     @classmethod
-    def node_value(cls, node):
-        if hasattr(node, "value"):
-            return str(node.value)
-        else:
-            return None
+    def _check_value(cls, val):
+        return lambda node: hasattr(node, "value") and str(node.value) == val
 
 
-def tile(ast, patterns, func):
+def tile(ast, patterns, func, clean=None):
     """
     Tiles over the given AST tree with a list of patterns,
     applying each. When a given pattern matches, the callback
@@ -134,25 +168,93 @@ def tile(ast, patterns, func):
     The function can return either None or a new AST node
     which replaces the node that was passed in.
 
+    If a clean dictionary is provided, any sub-tree in it is
+    skipped, and every sub-tree in which no pattern matched is
+    added to it, keyed by id. Re-using the dictionary for repeated
+    tiling of a tree only revisits the nodes that have changed,
+    or are above a change. The tree must not be modified other
+    than by the callback between uses.
+
     Returns the new AST tree.
     """
-    for p in patterns:
-        if p.matches(ast):
-            result = func(p, ast)
-            if result is not None:
-                ast=result
-
-    # Tile the left
-    if hasattr(ast, "left"):
-        result = tile(ast.left, patterns, func)
-        if result is not None:
-            ast.left=result
-
-    # Tile the right side
-    if hasattr(ast, "right"):
-        result = tile(ast.right, patterns, func)
-        if result is not None:
-            ast.right=result
-
-    return ast
+    candidates = pattern_index(patterns)
+
+    # The tree is walked with an explicit stack of visits. A visit
+    # of a node with the "post" flag marks it clean once its children
+    # are done. The root is stored as the left of a holder node.
+    holder = Holder(ast)
+    stack = [(holder, "left", None, False)]
+    while stack:
+        parent, attr, ast, post = stack.pop()
+
+        # Mark the sub-tree as clean if nothing changed
+        if post:
+            left = getattr(ast, "left", None)
+            if left is not None and id(left) not in clean:
+                continue
+            right = getattr(ast, "right", None)
+            if right is not None and id(right) not in clean:
+                continue
+            clean[id(ast)] = ast
+            continue
+
+        ast = getattr(parent, attr)
+        if clean is not None and id(ast) in clean:
+            continue
+
+        # Apply the patterns in order. If a node is replaced with
+        # a node of another class, the remaining patterns are
+        # looked up for the new class.
+        matched = False
+        name = ast.__class__.__name__
+        applicable = candidates(name)
+        i = 0
+        while i < len(applicable):
+            order, p = applicable[i]
+            i += 1
+            if p.matches(ast):
+                matched = True
+                result = func(p, ast)
+                if result is not None:
+                    ast = result
+                    if ast.__class__.__name__ != name:
+                        name = ast.__class__.__name__
+                        applicable = [c for c in candidates(name) if c[0] > order]
+                        i = 0
+        setattr(parent, attr, ast)
 
+        # Tile the left, then the right side, then mark
+        # the node clean if needed
+        if clean is not None and not matched:
+            stack.append((None, None, ast, True))
+        if hasattr(ast, "right") and ast.right is not None:
+            stack.append((ast, "right", None, False))
+        if hasattr(ast, "left") and ast.left is not None:
+            stack.append((ast, "left", None, False))
+
+    return holder.left
+
+
+class Holder(object):
+    "Holds the root of a tree being tiled"
+    __slots__ = ("left",)
+
+    def __init__(self, left):
+        self.left = left
+
+
+def pattern_index(patterns):
+    """
+    Returns a function that maps the name of a node class to
+    a list of (order, pattern) for the patterns that can match
+    it, in the original order of the patterns.
+    """
+    index = {}
+    def candidates(name):
+        applicable = index.get(name)
+        if applicable is None:
+            applicable = [(order, p) for order, p in enumerate(patterns)
+                    if p.types is None or name in p.types]
+            index[name] = applicable
+        return applicable
+    return candidates
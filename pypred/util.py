@@ -2,25 +2,21 @@
 Various utility methods that are used
 """
 import heapq
-from collections import defaultdict
+from collections import Counter
 
 def mode(lst):
     "Returns the most common value"
     # Count each item
-    counts = defaultdict(int)
-    for x in lst:
-        counts[x] += 1
-
-    # Determine the maximum count
-    max = 0
-    item = None
-    for val, count in counts.items():
-        if count > max:
-            max = count
-            item = val
+    counts = Counter(lst)
+    if not counts:
+        return None
 
-    # Return the most common
-    return item
+    # Return the first item in the list with the maximum count,
+    # so that ties do not depend on the dictionary order
+    max_count = max(counts.values())
+    for x in lst:
+        if counts[x] == max_count:
+            return x
 
 def median(lst):
     "Returns the median value"
@@ -36,8 +32,9 @@ def max_count(count):
     vals = []
     orig_names = {}
     for n,c in count.items():
-        orig_names[str(n)] = n
-        vals.append((-c, str(n)))
+        key = str(n)
+        orig_names[key] = n
+        vals.append((-c, key))
 
     heapq.heapify(vals)
     while len(vals):
@@ -86,6 +86,15 @@ class TestAST(object):
         assert a.right.modifiers == 'uis'
         assert b.right.modifiers == 'uims'
 
+    def test_regex_compiled_once(self):
+        a = self.ast("foo matches /abc/")
+        a.validate()
+        compiled = a.right.re
+        assert compiled is not None
+        a.validate()
+        assert a.right.re is compiled
+        assert a.right.eval(None) is compiled
+
     def test_match_bad_arg(self):
         a = ast.MatchOperator(ast.Literal("foo"), ast.Literal("bar"))
         valid, info = a.validate()
@@ -191,6 +200,119 @@ class TestAST(object):
         assert "r" not in ctx.literals
         assert "Left hand side" in ctx.failed[0]
 
+    def test_logical_eval_chain(self):
+        "Short circuit logic over a chain"
+        a = ast.Literal("a")
+        b = ast.Literal("b")
+        c = ast.Literal("c")
+        n = ast.LogicalOperator('and', a, ast.LogicalOperator('and', b, c))
+        ctx = ast.EvalContext(MockPred(), {"a": True, "b": False, "c": True})
+        assert n.eval(ctx) is False
+        assert "c" not in ctx.literals
+
+        n = ast.LogicalOperator('or', a, ast.LogicalOperator('and', b, c))
+        ctx = ast.EvalContext(MockPred(), {"a": False, "b": True, "c": 1})
+        assert n.eval(ctx) is True
+
+        n = ast.LogicalOperator('or', a, ast.LogicalOperator('or', b, c))
+        ctx = ast.EvalContext(MockPred(), {"a": False, "b": False, "c": False})
+        assert n.eval(ctx) is False
+        assert ctx.literals["c"] == False
+
+    def test_slots(self):
+        l = ast.Literal("l")
+        n = ast.CompareOperator('=', l, ast.Number(1))
+        assert not hasattr(l, "__dict__")
+        assert not hasattr(n, "__dict__")
+        for node in (ast.Undefined(), ast.Empty(), ast.Regex("/a/"),
+                ast.NegateOperator(l), ast.Both(l, l), ast.Branch(l, l, l),
+                ast.CachedNode(l, 0), ast.PushResult(None, l)):
+            assert not hasattr(node, "__dict__")
+        assert n.position == "line: ?, col: ?"
+        n.set_position(1, 2)
+        assert n.position == "line: 1, col 2"
+
+    def test_literal_interned(self):
+        a = ast.Literal("".join(["na", "me"]))
+        b = ast.Literal("".join(["nam", "e"]))
+        assert a.value is b.value
+
+    def test_compare_category(self):
+        l = ast.Literal("l")
+        c = ast.CompareOperator('>', l, ast.Number(1))
+        assert c.category == "order"
+        c.reverse()
+        assert c.category == "order"
+        assert ast.CompareOperator('!=', l, l).category == "equality"
+        assert ast.CompareOperator('is', l, l).category == "equality"
+
+    def test_compare_reverse_eval(self):
+        l = ast.Literal("l")
+        r = ast.Literal("r")
+        c = ast.CompareOperator('<', l, r)
+        d = {"l": 1, "r": 5}
+        assert c.evaluate(MockPred(), d)
+        c.reverse()
+        assert c.type == '>'
+        assert c.evaluate(MockPred(), d)
+
+    def test_dup(self):
+        l = ast.Literal("l")
+        c = ast.CompareOperator('>', l, ast.Number(1))
+        c.set_position(1, 3)
+        n = ast.LogicalOperator('or', ast.NegateOperator(c),
+                ast.ContainsOperator(ast.LiteralSet([l]), l))
+
+        d = ast.dup(n)
+        assert d is not n
+        assert d.left is not n.left
+        assert d.left.left is not c
+        assert d.left.left.type == '>'
+        assert d.left.left.position == "line: 1, col 3"
+        assert d.left.left.left is l
+        assert d.right.right is l
+        assert d.right.left == n.right.left
+
+    def test_pre(self):
+        a = ast.Literal("a")
+        b = ast.Literal("b")
+        c = ast.Literal("c")
+        n = ast.LogicalOperator('and', ast.NegateOperator(a),
+                ast.LogicalOperator('or', b, c))
+        nodes = []
+        n.pre(nodes.append)
+        assert nodes == [n, n.left, a, n.right, b, c]
+
+    def test_iter_pre(self):
+        a = ast.Literal("a")
+        b = ast.Literal("b")
+        n = ast.LogicalOperator('or', ast.NegateOperator(a), b)
+        assert list(n.iter_pre()) == [n, n.left, a, b]
+
+    def test_pre_branch(self):
+        a = ast.Literal("a")
+        b = ast.Literal("b")
+        n = ast.Branch(a, None, ast.PushResult(None, b))
+        nodes = []
+        n.pre(nodes.append)
+        assert nodes == [n, n.right, b]
+
+    def test_children(self):
+        a = ast.Literal("a")
+        b = ast.Literal("b")
+        assert a.children() == ()
+        assert ast.NegateOperator(a).children() == (a,)
+        assert ast.CompareOperator('=', a, b).children() == (a, b)
+        assert ast.Branch(a, b, None).children() == (b,)
+
+    def test_pre_deep(self):
+        n = ast.Literal("a")
+        for x in range(5000):
+            n = ast.NegateOperator(n)
+        nodes = []
+        n.pre(nodes.append)
+        assert len(nodes) == 5001
+
     def test_negate_false(self):
         l = ast.Literal("l")
         a = ast.NegateOperator(l)
@@ -414,6 +536,35 @@ class TestAST(object):
         assert False in res
         assert 2 in res
 
+    def test_litset_eval_reassign(self):
+        s = ast.LiteralSet([ast.Number(1), ast.Literal('a')])
+        s.value = frozenset([ast.Number(2), ast.Literal('b')])
+        ctx = ast.EvalContext(MockPred(), {'a': 3, 'b': 4})
+        res = s.eval(ctx)
+        assert res == frozenset([2, 4])
+
+    def test_litset_undefined_empty(self):
+        a = self.ast("{1 undefined} contains x")
+        valid, info = a.validate()
+        assert valid
+        assert a.evaluate(MockPred(), {"x": 1})
+        assert a.evaluate(MockPred(), {})
+        assert not a.evaluate(MockPred(), {"x": 2})
+
+        s = self.ast("{empty 'a'} contains x").left
+        s.static_resolve(MockPred())
+        assert s.static
+        assert ast.Empty() in s.static_val
+        assert (ast.KIND_EMPTY, None) in s.keys()
+
+    def test_litset_keys(self):
+        s = ast.LiteralSet([ast.Number(1), ast.Literal('a'), ast.Constant(True)])
+        assert s.keys() == frozenset([(ast.KIND_NUMBER, 1.0),
+            (ast.KIND_LITERAL, 'a'), (ast.KIND_CONSTANT, True)])
+
+        s.value = frozenset([ast.Literal('1')])
+        assert s.keys() == frozenset([(ast.KIND_LITERAL, '1')])
+
     def test_litset_static(self):
         s = ast.LiteralSet([ast.Constant(True), ast.Literal('\"a\"')])
         pred = MockPred()
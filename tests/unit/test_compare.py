@@ -54,6 +54,35 @@ class TestCompare(object):
         assert cmp.right is static
         assert cmp.type == ">"
 
+    def test_fold_static(self):
+        "Test folding of static comparisons"
+        l = ast.Literal("'string'")
+        l.static = True
+        l.static_val = 'string'
+        c1 = ast.CompareOperator('=', l, l)
+
+        c2 = ast.CompareOperator('<', ast.Number(1), ast.Number(2))
+        c3 = ast.CompareOperator('>', ast.Literal('foo'), ast.Number(2))
+        c4 = ast.CompareOperator('>', ast.Number(1), ast.Number(2))
+        n = ast.LogicalOperator('and', ast.LogicalOperator('or', c1, c2),
+                ast.LogicalOperator('or', c3, c4))
+
+        n = compare.fold_static(n)
+        assert n.left.left is ast.TRUE
+        assert n.left.right is ast.TRUE
+        assert n.right.left is c3
+        assert n.right.right is ast.FALSE
+
+    def test_fold_static_types(self):
+        "Test folding leaves incompatible types"
+        # Complex numbers have no ordering on any python version
+        static = ast.Literal("complex")
+        static.static = True
+        static.static_val = 1j
+        c = ast.CompareOperator('>', static, ast.Number(2))
+
+        assert compare.fold_static(c) is c
+
     def test_select_rewrite_eq(self):
         "Test rewrite selection for equality"
         l = ast.Literal('foo')
@@ -438,3 +467,45 @@ class TestCompare(object):
         assert ASTPattern(or2).matches(r.right)
 
 
+
+    def test_order_implications(self):
+        "Tests the table used for numeric order rewrites"
+        impl = compare.ORDER_IMPLIES
+        assert len(impl) == 48
+
+        # a < 5 -> a < 10, not a > 10, a > 0 unknown
+        assert impl[("<", "<", 1)] == True
+        assert impl[("<", ">", 1)] == False
+        assert impl[("<", ">", -1)] is None
+
+        # a < 5 -> a <= 5, not a >= 5
+        assert impl[("<", "<=", 0)] == True
+        assert impl[("<", ">=", 0)] == False
+
+        # a <= 5 does not determine a < 5
+        assert impl[("<=", "<", 0)] is None
+
+        # a >= 5 -> a > 0, not a < 5
+        assert impl[(">=", ">", -1)] == True
+        assert impl[(">=", "<", 0)] == False
+
+    def test_rewrite_shares_constants(self):
+        "Tests that nodes with the same operator and value share a rewrite"
+        l = ast.Literal('foo')
+        cmp1 = ast.CompareOperator('>', l, ast.Number(10))
+        cmp2 = ast.CompareOperator('>', l, ast.Number(10))
+        cmp3 = ast.CompareOperator('<', l, ast.Number(0))
+        or1 = ast.LogicalOperator('or', cmp2, cmp3)
+
+        # Rewrite foo > 10 as True
+        name = merge.node_name(cmp1, True)
+        r = compare.order_rewrite(ast.dup(or1), name, cmp1, True)
+
+        assert isinstance(r.left, ast.Constant)
+        assert r.left.value == True
+        assert isinstance(r.right, ast.Constant)
+        assert r.right.value == False
+
+        # Same operator and value should share a replacement
+        r = compare.order_rewrite(ast.LogicalOperator('or', cmp1, cmp2), name, cmp1, True)
+        assert r.left is r.right
@@ -1,6 +1,7 @@
 """
 Unit tests for the lexer
 """
+import ply.lex as lex
 from pypred import parser
 
 class TestLexer(object):
@@ -104,3 +105,41 @@ class TestLexer(object):
         expected = ['LBRACK', 'TRUE', 'FALSE', 'NUMBER', 'STRING', 'RBRACK']
         self.assert_types(inp, expected)
 
+
+    def test_error_isolated(self):
+        lexer = parser.get_lexer()
+        lexer.input("!! foo\nbar")
+        list(lexer)
+        assert len(lexer.errors) == 1
+
+        lexer2 = parser.get_lexer()
+        lexer2.input("foo")
+        list(lexer2)
+        assert lexer2.errors == []
+        assert lexer2.lineno == 1
+
+    def test_matches_ply(self):
+        ply_lexer = lex.lex(module=parser)
+        inputs = [
+            "a>=1 and b<=-2.5 or c!={1 'x' \"y\"}",
+            "name matches /^t.*$/i # comment\n\n foo == -bar",
+            "!! foo\n@@\tbar !",
+            "1.2.3 -x :a; not(true)",
+        ]
+        for inp in inputs:
+            l1 = ply_lexer.clone()
+            l1.errors = []
+            l1.input(inp)
+            l2 = parser.get_lexer()
+            l2.input(inp)
+
+            t1 = [(t.type, t.value, t.lineno, t.lexpos) for t in l1]
+            t2 = [(t.type, t.value, t.lineno, t.lexpos) for t in l2]
+            assert t1 == t2
+            assert l1.errors == l2.errors
+
+    def test_types_interned(self):
+        lexer = parser.get_lexer()
+        lexer.input("a and 1 >= {b}")
+        for t in lexer:
+            assert t.type is parser.tokens[parser.tokens.index(t.type)]
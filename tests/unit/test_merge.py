@@ -157,5 +157,30 @@ name matches '^test$' and list contains elem and foo > 20
         assert m.right.left.pred   == p3
         assert m.right.right.pred  == p4
 
-
-
+    def test_index_equality(self):
+        "Tests equality checks on the same literal are indexed"
+        preds = [predicate.Predicate(s) for s in
+                ("name is 'Jack'", "name = 'Jill'", "name is 'Joe'",
+                 "name is 'Jill'", "age > 2", "other is 'Jack'")]
+        m = merge.merge(preds)
+        merge.static_resolution(m, preds[0])
+        m = merge.index_equality(m, 4)
+
+        dispatch = m.right
+        assert isinstance(dispatch, ast.IndexedDispatch)
+        assert dispatch.expr.value == "name"
+        assert dispatch.table == {
+            "Jack": [preds[0]],
+            "Jill": [preds[1], preds[3]],
+            "Joe": [preds[2]],
+        }
+        assert m.left.left.pred == preds[4]
+        assert m.left.right.pred == preds[5]
+
+    def test_index_equality_min_count(self):
+        "Tests small groups are not indexed"
+        preds = [predicate.Predicate("name is 'Jack'"),
+                 predicate.Predicate("name is 'Jill'")]
+        m = merge.merge(preds)
+        merge.static_resolution(m, preds[0])
+        assert merge.index_equality(m, 4) is m
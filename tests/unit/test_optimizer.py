@@ -242,3 +242,13 @@ class TestOptimizer(object):
         assert isinstance(r, ast.Constant)
         assert r.value == False
 
+
+    def test_shared_constants(self):
+        "Tests replacements use the shared constants"
+        t = ast.Constant(True)
+        f = ast.Constant(False)
+        c, r = optimizer.optimization_pass(ast.LogicalOperator('and', t, f))
+        assert r is ast.FALSE
+
+        c, r = optimizer.optimization_pass(ast.LogicalOperator('or', t, f))
+        assert r is ast.TRUE
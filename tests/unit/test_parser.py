@@ -12,8 +12,7 @@ class TestParser(object):
         assert isinstance(res, ast.Node)
 
         # Do a pre-order traversal
-        nodes = []
-        res.pre(lambda n: nodes.append(n))
+        nodes = list(res.iter_pre())
 
         # Get the class names
         names = [repr(n) for n in nodes]
@@ -162,3 +161,16 @@ class TestParser(object):
         assert isinstance(res, ast.CompareOperator)
         assert len(p.errors) == 3
 
+
+    def test_error_isolated(self):
+        lexer = parser.get_lexer()
+        p = parser.get_parser(lexer=lexer)
+        p.parse("a > 1 b > 2", lexer=lexer)
+        assert len(p.errors) == 3
+
+        lexer = parser.get_lexer()
+        p2 = parser.get_parser(lexer=lexer)
+        res = p2.parse("a > 1", lexer=lexer)
+        assert isinstance(res, ast.CompareOperator)
+        assert p2.errors == []
+        assert len(p.errors) == 3
@@ -1,6 +1,7 @@
 """
 Unit tests for the lexer
 """
+import pickle
 from pypred import Predicate, ast
 
 class TestPredicate(object):
@@ -19,6 +20,13 @@ class TestPredicate(object):
 		Literal 'Jill' at line: 2, col 15
 """
 
+    def test_description_cached(self):
+        p = Predicate("name is 'Jack' and friend is 'Jill'")
+        d = p.description()
+        assert p.description() is d
+        assert p.description(max_depth=1) == "AND operator at line: 1, col 16\n\t...\n\t...\n"
+        assert p.description() is d
+
     def test_error(self):
         p = Predicate("foo is\nbar !! fun")
         assert not p.is_valid()
@@ -54,6 +62,11 @@ class TestPredicate(object):
         p = Predicate("name is 'Jack' and friend is 'Jill'")
         assert p.resolve_identifier({}, "name") == ast.Undefined()
 
+    def test_resolve_missing_shared(self):
+        p = Predicate("name is 'Jack'")
+        assert p.resolve_identifier({}, "name") is ast.UNDEFINED
+        assert p.static_resolve("name") is ast.UNDEFINED
+
     def test_resolve_present(self):
         p = Predicate("name is 'Jack' and friend is 'Jill'")
         assert p.resolve_identifier({"name": "abc"}, "name") == "abc"
@@ -88,3 +101,29 @@ class TestPredicate(object):
         r1 = p.resolve_identifier({}, "answer")
         assert r1 == 42
 
+
+    def test_parse_cached(self):
+        p1 = Predicate("name is 'Jack' and friend is 'Jill'")
+        p2 = Predicate("name is 'Jack' and friend is 'Jill'")
+        assert p1.ast is not p2.ast
+        assert p1.ast.left.left is not p2.ast.left.left
+        assert p1.description() == p2.description()
+
+    def test_parse_cached_errors(self):
+        p1 = Predicate("foo is\nbar !! fun")
+        p1.errors()['errors'].append("extra")
+        p2 = Predicate("foo is\nbar !! fun")
+        assert p2.errors()['errors'] == [
+            'Failed to parse characters !! at line 2, col 5',
+            'Syntax error with fun at line 2, col 8',
+        ]
+
+    def test_pickle(self):
+        p = Predicate("name is 'Jack' and {1 undefined} contains x")
+        assert p.evaluate({'name': 'Jack', 'x': 1})
+        for proto in range(pickle.HIGHEST_PROTOCOL + 1):
+            p2 = pickle.loads(pickle.dumps(p, proto))
+            assert p2.description() == p.description()
+            assert p2.evaluate({'name': 'Jack', 'x': 1})
+            assert p2.evaluate({'name': 'Jack'})
+            assert not p2.evaluate({'name': 'Jill', 'x': 1})
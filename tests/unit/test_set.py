@@ -1,5 +1,6 @@
+import pickle
 import pytest
-from pypred import OptimizedPredicateSet, PredicateSet, Predicate
+from pypred import OptimizedPredicateSet, PredicateSet, Predicate, ast
 
 class TestPredicateSet(object):
     def test_two(self):
@@ -55,3 +56,95 @@ class TestOptPredicateSet(object):
         with pytest.raises(Exception):
             s.add(p3)
 
+
+    def test_pickle_finalized(self):
+        names = ["Jack", "Jill", "Joe", "Jane", "John"]
+        preds = [Predicate("name is '%s'" % n) for n in names]
+        preds.append(Predicate("age > 10 and {1 undefined} contains x"))
+        s = OptimizedPredicateSet(preds)
+        s.finalize()
+        for proto in range(pickle.HIGHEST_PROTOCOL + 1):
+            s2, preds2 = pickle.loads(pickle.dumps((s, preds), proto))
+            assert s2.evaluate({'name': 'Joe'}) == [preds2[2]]
+            assert s2.evaluate({'age': 20, 'x': 1}) == [preds2[5]]
+            assert s2.evaluate({'name': 'Bob'}) == []
+
+    def test_dispatch(self):
+        names = ["Jack", "Jill", "Joe", "Jane", "John"]
+        preds = [Predicate("name is '%s'" % n) for n in names]
+        p_age = Predicate("age = 1")
+        s = OptimizedPredicateSet(preds + [p_age])
+        assert "IndexedDispatch" in s.description()
+
+        assert s.evaluate({'name': 'Joe'}) == [preds[2]]
+        assert s.evaluate({'name': 'Bob'}) == []
+        assert s.evaluate({'name': ['Joe']}) == []
+        assert s.evaluate({'name': 'Jane', 'age': 1}) in \
+                ([preds[3], p_age], [p_age, preds[3]])
+
+    def test_dispatch_analyze(self):
+        names = ["Jack", "Jill", "Joe", "Jane", "John"]
+        preds = [Predicate("name is '%s'" % n) for n in names]
+        s = OptimizedPredicateSet(preds)
+        assert "IndexedDispatch" in s.description()
+
+        res, matches, ctx = s.analyze({'name': 'Joe'})
+        assert res
+        assert matches == [preds[2]]
+        assert "Predicate 'name is 'Jack'' failed to match" in ctx.failed
+        assert "Predicate 'name is 'Joe'' failed to match" not in ctx.failed
+
+        res, matches, ctx = s.analyze({'name': 'Bob'})
+        assert not res
+        assert matches == []
+        for n in names:
+            assert "Predicate 'name is '%s'' failed to match" % n in ctx.failed
+        assert any("right: 'Jill'" in f for f in ctx.failed)
+        assert not any("IndexedDispatch" in f for f in ctx.failed)
+
+    def test_dispatch_custom_eq(self):
+        class NoCase(str):
+            def __eq__(self, other):
+                return self.lower() == other.lower()
+            __hash__ = str.__hash__
+
+        class Unhashable(object):
+            __hash__ = None
+            def __eq__(self, other):
+                return other == "Joe"
+
+        names = ["Jack", "Jill", "Joe", "Jane", "John"]
+        preds = [Predicate("name is '%s'" % n) for n in names]
+        s = OptimizedPredicateSet(preds)
+        assert "IndexedDispatch" in s.description()
+        for value in (NoCase("joe"), Unhashable()):
+            doc = {'name': value}
+            assert PredicateSet(preds).evaluate(doc) == [preds[2]]
+            assert s.evaluate(doc) == [preds[2]]
+
+    def test_dispatch_reach(self):
+        names = ["Jack", "Jill", "Joe", "Jane", "John"]
+        preds = [Predicate("name is '%s'" % n) for n in names]
+        s = OptimizedPredicateSet(preds)
+        s.compile_ast()
+        assert "IndexedDispatch" in s.description()
+        s._results = []
+        ctx = ast.EvalContext(s, {'name': 'Joe'})
+        assert s.ast.eval(ctx)
+        assert s._results == [preds[2]]
+        assert ctx.reach == len(names)
+
+    def test_set_undefined(self):
+        p1 = Predicate("{1 undefined} contains x")
+        p2 = Predicate("{2 3} contains x")
+        s = OptimizedPredicateSet([p1, p2])
+        assert s.evaluate({'x': 1}) == [p1]
+        assert s.evaluate({}) == [p1]
+        assert s.evaluate({'x': 3}) == [p2]
+
+    def test_short_circuit_protects(self):
+        "The right side is skipped when the left side fails"
+        p = Predicate("x contains 'a' and y < 5")
+        doc = {"x": "bcd", "y": "str"}
+        assert PredicateSet([p]).evaluate(doc) == []
+        assert OptimizedPredicateSet([p]).evaluate(doc) == []
@@ -1,3 +1,4 @@
+import pytest
 from pypred import ast, tiler
 
 class TestTiler(object):
@@ -17,6 +18,24 @@ class TestTiler(object):
         c1 = ast.CompareOperator('is', l, z)
         assert not p.matches(c1)
 
+    def test_ast_pattern_nested(self):
+        l = ast.Literal('foo')
+        c1 = ast.CompareOperator('>', l, ast.Number(1))
+        c2 = ast.CompareOperator('<', l, ast.Number(2))
+        n = ast.LogicalOperator('and', c1, ast.NegateOperator(c2))
+        p = tiler.ASTPattern(n)
+
+        # Structurally equal trees match
+        c3 = ast.CompareOperator('<', ast.Literal('foo'), ast.Number(2))
+        n2 = ast.LogicalOperator('and', c1, ast.NegateOperator(c3))
+        assert p.matches(n2)
+
+        # Difference deep in the tree
+        c4 = ast.CompareOperator('<', l, ast.Number(3))
+        n3 = ast.LogicalOperator('and', c1, ast.NegateOperator(c4))
+        assert not p.matches(n3)
+        assert not p.matches(c1)
+
     def test_simple_sub_pattern(self):
         l = ast.Literal('foo')
         r = ast.Regex('^tubez$')
@@ -68,6 +87,10 @@ class TestTiler(object):
         n = ast.CompareOperator('=', l, r)
         assert p.matches(n)
 
+    def test_simple_pattern_invalid(self):
+        with pytest.raises(Exception):
+            tiler.SimplePattern('types:Literal AND bogus:1')
+
     def test_tile(self):
         p = tiler.SimplePattern('types:CompareOperator AND op:=',
                 'types:Literal', 'types:Literal')
@@ -95,3 +118,56 @@ class TestTiler(object):
         assert n == tiler.tile(n, [p], func)
         assert i['count'] == 2
 
+
+    def test_tile_clean(self):
+        p = tiler.SimplePattern('types:CompareOperator AND op:=',
+                'types:Literal', 'types:Literal')
+
+        n1 = ast.CompareOperator('=', ast.Literal('foo'), ast.Literal('bar'))
+        n2 = ast.CompareOperator('>', ast.Literal('zip'), ast.Literal('baz'))
+        n = ast.LogicalOperator('or', n1, n2)
+
+        i = {'count': 0}
+        def func(pattern, node):
+            i['count'] += 1
+
+        clean = {}
+        assert n == tiler.tile(n, [p], func, clean)
+        assert i['count'] == 1
+        assert id(n2) in clean
+        assert id(n1) not in clean
+        assert id(n) not in clean
+
+        # Only the matching sub-tree is revisited
+        assert n == tiler.tile(n, [p], func, clean)
+        assert i['count'] == 2
+
+    def test_tile_replaced_class(self):
+        "Patterns after a replacement are checked against the new node"
+        p1 = tiler.SimplePattern('types:NegateOperator')
+        p2 = tiler.SimplePattern('types:Literal')
+        p3 = tiler.SimplePattern('types:NegateOperator')
+
+        l = ast.Literal('foo')
+        n = ast.NegateOperator(ast.Literal('bar'))
+        seen = []
+        def func(pattern, node):
+            seen.append((pattern, node))
+            if pattern is p1:
+                return l
+
+        assert tiler.tile(n, [p1, p2, p3], func) is l
+        assert seen == [(p1, n), (p2, l)]
+
+    def test_tile_deep(self):
+        n = ast.Literal('foo')
+        for x in range(5000):
+            n = ast.NegateOperator(n)
+
+        p = tiler.SimplePattern('types:Literal')
+        i = {'count': 0}
+        def func(pattern, node):
+            i['count'] += 1
+
+        assert n == tiler.tile(n, [p], func)
+        assert i['count'] == 1
@@ -6,6 +6,12 @@ class TestUtil(object):
         v = [1,2,3,5,5,5,4,3,1]
         assert 5 == util.mode(v)
 
+    def test_mode_tie(self):
+        "Tests mode selection picks the first of the most common"
+        assert 2 == util.mode([2, 1, 1, 2])
+        assert 1 == util.mode([3, 1, 2, 2, 1])
+        assert None == util.mode([])
+
     def test_median(self):
         "Tests mode selection"
         v = list(range(0, 100))